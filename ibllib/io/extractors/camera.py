@@ -2,16 +2,19 @@
 This module handles extraction of camera timestamps for both Bpod and FPGA.
 """
 import logging
-from functools import partial
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, lru_cache
+from pathlib import Path
 
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
+from numba import jit
 
 from oneibl.stream import VideoStreamer
 import ibllib.dsp.utils as dsp
 from ibllib.misc import range_str
-from ibllib.plots import squares, vertical_lines
+from ibllib.io import ffmpeg
 from ibllib.io.video import assert_valid_label
 from brainbox.numerical import within_ranges
 from ibllib.io.extractors.base import get_session_extractor_type
@@ -27,37 +30,93 @@ from ibllib.io.extractors.base import (
 _logger = logging.getLogger('ibllib')
 
 
-def extract_camera_sync(sync, chmap=None):
+def extract_camera_sync(sync, chmap=None, labels=('right', 'left', 'body')):
     """
     Extract camera timestamps from the sync matrix
 
     :param sync: dictionary 'times', 'polarities' of fronts detected on sync trace
     :param chmap: dictionary containing channel indices. Default to constant.
+    :param labels: the camera labels to extract; only the corresponding channels are scanned
     :return: dictionary containing camera timestamps
     """
     assert(chmap)
-    sr = _get_sync_fronts(sync, chmap['right_camera'])
-    sl = _get_sync_fronts(sync, chmap['left_camera'])
-    sb = _get_sync_fronts(sync, chmap['body_camera'])
-    return {'right': sr.times[::2],
-            'left': sl.times[::2],
-            'body': sb.times[::2]}
+    labels = (labels,) if isinstance(labels, str) else labels
+    return {label: _get_sync_fronts(sync, chmap[f'{label}_camera']).times[::2]
+            for label in labels}
 
 
-def get_video_length(video_path):
+def get_video_length(video_path, use_ffprobe=True):
     """
-    Returns video length
+    Returns video length.  The lengths of local files are cached on their modification time and
+    size, so a file is only read once unless modified.
     :param video_path: A path to the video
+    :param use_ffprobe: If True, the length of a local video file is read from the container
+    metadata using ffprobe when available, otherwise the video is opened with OpenCV
     :return:
     """
     is_url = isinstance(video_path, str) and video_path.startswith('http')
-    cap = VideoStreamer(video_path).cap if is_url else cv2.VideoCapture(str(video_path))
+    if not is_url and Path(video_path).exists():
+        stat = Path(video_path).stat()
+        return _get_video_length_cached(
+            str(Path(video_path).resolve()), stat.st_mtime_ns, stat.st_size, use_ffprobe)
+    return _get_video_length(video_path, use_ffprobe=use_ffprobe)
+
+
+@lru_cache(maxsize=64)
+def _get_video_length_cached(video_path, mtime_ns, size, use_ffprobe):
+    """Cached call to _get_video_length, the file modification time and size are the cache key"""
+    return _get_video_length(video_path, use_ffprobe=use_ffprobe)
+
+
+def _get_video_length(video_path, use_ffprobe=True):
+    is_url = isinstance(video_path, str) and video_path.startswith('http')
+    if use_ffprobe and not is_url:
+        length = ffmpeg.get_frame_count(video_path)
+        if length is not None:
+            return length
+    # Request the FFMPEG backend directly rather than letting OpenCV probe each backend in turn
+    cap = (VideoStreamer(video_path).cap if is_url
+           else cv2.VideoCapture(str(video_path), cv2.CAP_FFMPEG))
     assert cap.isOpened(), f'Failed to open video file {video_path}'
     length = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     cap.release()
     return length
 
 
+def _group_median(x, groups, n):
+    """
+    Returns the median of the values in `x` for each group.
+    :param x: an array of values
+    :param groups: an array of integer group labels in range(n), the same size as `x`
+    :param n: the number of groups
+    :return: an array of length n of medians; NaN for groups with no values
+    """
+    order = np.lexsort((x, groups))  # sort values within each group
+    x = x[order]
+    counts = np.bincount(groups, minlength=n)
+    offsets = np.cumsum(counts) - counts
+    medians = np.full(n, np.nan)
+    ok = counts > 0
+    lo = offsets[ok] + (counts[ok] - 1) // 2
+    hi = offsets[ok] + counts[ok] // 2
+    medians[ok] = (x[lo] + x[hi]) / 2
+    return medians
+
+
+@jit(nopython=True, cache=True)
+def _is_strictly_increasing(x):
+    """
+    Returns True if each value in the array is greater than the previous one.  Unlike
+    `np.all(np.diff(x) > 0)` this doesn't allocate and returns at the first failure.
+    :param x: a 1D array
+    :return: bool
+    """
+    for i in range(x.size - 1):
+        if not x[i + 1] > x[i]:  # also False for NaNs
+            return False
+    return True
+
+
 class CameraTimestampsFPGA(BaseExtractor):
 
     def __init__(self, label, session_path=None):
@@ -72,7 +131,7 @@ class CameraTimestampsFPGA(BaseExtractor):
         _logger.setLevel(self._log_level)
 
     def _extract(self, sync=None, chmap=None, video_path=None,
-                 display=False, extrapolate_missing=True):
+                 display=False, extrapolate_missing=True, audio=None):
         """
         The raw timestamps are taken from the FPGA. These are the times of the camera's frame TTLs.
         If the pin state file exists, these timestamps are aligned to the video frames using the
@@ -88,15 +147,18 @@ class CameraTimestampsFPGA(BaseExtractor):
         :param display: if True, the audio and GPIO fronts are plotted.
         :param extrapolate_missing: if True, any missing timestamps at the beginning and end of
         the session are extrapolated based on the median frame rate, otherwise they will be NaNs.
+        :param audio: optional dictionary 'times', 'polarities' of the audio fronts.  If None,
+        they are extracted from the sync.
         :return: a numpy array of camera timestamps
         """
-        fpga_times = extract_camera_sync(sync=sync, chmap=chmap)
+        fpga_times = extract_camera_sync(sync=sync, chmap=chmap, labels=self.label)
         count, (*_, gpio) = raw.load_embedded_frame_data(self.session_path, self.label)
 
         if gpio is not None and gpio['indices'].size > 1:
             _logger.info('Aligning to audio TTLs')
             # Extract audio TTLs
-            audio = _get_sync_fronts(sync, chmap['audio'])
+            if audio is None:
+                audio = _get_sync_fronts(sync, chmap['audio'])
             _, ts = raw.load_camera_ssv_times(self.session_path, self.label)
             try:
                 """
@@ -213,11 +275,18 @@ class CameraTimestampsBpod(BaseBpodTrialsExtractor):
         if n_missing > 0:
             _logger.warning(f'{n_missing} fewer Bpod timestamps than frames; '
                             f'{"extrapolating" if extrapolate_missing else "appending nans"}')
-            frate = np.median(np.diff(raw_ts))
-            to_app = ((np.arange(n_missing, ) + 1) / frate + raw_ts[-1]
-                      if extrapolate_missing
-                      else np.full(n_missing, np.nan))
-            raw_ts = np.r_[raw_ts, to_app]  # Append the missing times
+            # Append the missing times to a preallocated array
+            ts = np.empty(raw_ts.size + n_missing)
+            ts[:raw_ts.size] = raw_ts
+            to_app = ts[raw_ts.size:]
+            if extrapolate_missing:
+                frate = np.median(np.diff(raw_ts))
+                to_app[:] = np.arange(1, n_missing + 1)
+                to_app /= frate
+                to_app += raw_ts[-1]
+            else:
+                to_app[:] = np.nan
+            raw_ts = ts
         elif n_missing < 0:
             _logger.warning(f'{abs(n_missing)} fewer frames than Bpod timestamps')
 
@@ -227,70 +296,113 @@ class CameraTimestampsBpod(BaseBpodTrialsExtractor):
         ntrials = len(self.bpod_trials)
 
         cam_times = []
-        n_frames = 0
-        n_out_of_sync = 0
+        cam_pout = []
+        trial_ids = []
         missed_trials = []
         for ind in np.arange(ntrials):
             # get upgoing and downgoing fronts
-            pin = np.array(self.bpod_trials[ind]['behavior_data']
-                           ['Events timestamps'].get('Port1In'))
-            pout = np.array(self.bpod_trials[ind]['behavior_data']
-                            ['Events timestamps'].get('Port1Out'))
+            events = self.bpod_trials[ind]['behavior_data']['Events timestamps']
+            pin, pout = events.get('Port1In'), events.get('Port1Out')
             # some trials at startup may not have the camera working, discard
-            if np.all(pin) is None:
+            if pin is None or pout is None:
                 missed_trials.append(ind)
                 continue
+            pin, pout = np.asarray(pin), np.asarray(pout)
             # if the trial starts in the middle of a square, discard the first downgoing front
             if pout[0] < pin[0]:
                 pout = pout[1:]
             # same if the last sample is during an upgoing front,
             # always put size as it happens last
             pin = pin[:pout.size]
-            frate = np.median(np.diff(pin))
-            if ind > 0:
-                """
-                assert that the pulses have the same length and that we don't miss frames during
-                the trial, the refresh rate of bpod is 100us
-                """
-                test1 = np.all(np.abs(1 - (pin - pout) / np.median(pin - pout)) < 0.1)
-                test2 = np.all(np.abs(np.diff(pin) - frate) <= 0.00011)
-                if not all([test1, test2]):
-                    n_out_of_sync += 1
             # grow a list of cam times for ech trial
             cam_times.append(pin)
-            n_frames += pin.size
+            cam_pout.append(pout)
+            trial_ids.append(ind)
 
         if missed_trials:
             _logger.debug('trial(s) %s missing TTL events', range_str(missed_trials))
+        if not cam_times:
+            return np.array([])
+
+        """
+        Assert that the pulses have the same length and that we don't miss frames during the
+        trial, the refresh rate of bpod is 100us.  The per-trial tests are computed across all
+        trials at once on the concatenated fronts, using the trial number as a group key.
+        """
+        ncam = len(cam_times)
+        flat_pin = np.concatenate(cam_times)
+        sizes = np.array([c.size for c in cam_times])
+        trial = np.repeat(np.arange(ncam), sizes)
+        width = flat_pin - np.concatenate(cam_pout)
+        test1 = np.abs(1 - width / _group_median(width, trial, ncam)[trial]) < 0.1
+        # Frame intervals within each trial, i.e. excluding the inter-trial intervals
+        within = trial[1:] == trial[:-1]
+        dpin = np.diff(flat_pin)[within]
+        dtrial = trial[1:][within]
+        frame_interval = _group_median(dpin, dtrial, ncam)  # median frame interval per trial
+        test2 = np.abs(dpin - frame_interval[dtrial]) <= 0.00011
+        out_of_sync = (np.bincount(trial[~test1], minlength=ncam) +
+                       np.bincount(dtrial[~test2], minlength=ncam)) > 0
+        n_out_of_sync = np.sum(out_of_sync & (np.array(trial_ids) > 0))
+        n_frames = flat_pin.size
+
         if n_out_of_sync > 0:
             _logger.warning(f"{n_out_of_sync} trials with bpod camera frame times not within"
                             f" 10% of the expected sampling rate")
 
         t_first_frame = np.array([c[0] for c in cam_times])
         t_last_frame = np.array([c[-1] for c in cam_times])
-        frate = 1 / np.nanmedian(np.array([np.median(np.diff(c)) for c in cam_times]))
+        frate = 1 / np.nanmedian(frame_interval)
         intertrial_duration = t_first_frame[1:] - t_last_frame[:-1]
         intertrial_missed_frames = np.int32(np.round(intertrial_duration * frate)) - 1
 
         # initialize the full times array
         frame_times = np.zeros(n_frames + int(np.sum(intertrial_missed_frames)))
-        ii = 0
-        for trial, cam_time in enumerate(cam_times):
-            if cam_time is not None:
-                # populate first the recovered times within the trials
-                frame_times[ii: ii + cam_time.size] = cam_time
-                ii += cam_time.size
-            if trial == (len(cam_times) - 1):
-                break
-            # then extrapolate in-between
-            nmiss = intertrial_missed_frames[trial]
-            frame_times[ii: ii + nmiss] = (cam_time[-1] + intertrial_duration[trial] /
-                                           (nmiss + 1) * (np.arange(nmiss) + 1))
-            ii += nmiss
-        assert all(np.diff(frame_times) > 0)  # negative diffs implies a big problem
+        # each trial is shifted by the number of frames missed in the preceding inter-trials
+        shift = np.r_[0, np.cumsum(intertrial_missed_frames)]
+        # populate first the recovered times within the trials
+        frame_times[np.arange(n_frames) + np.repeat(shift, sizes)] = flat_pin
+        # then extrapolate in-between, the nth missed frame of gap i being at
+        # t_last_frame[i] + intertrial_duration[i] / (nmiss[i] + 1) * n
+        nmiss = np.maximum(intertrial_missed_frames, 0)
+        gap = np.repeat(np.arange(ncam - 1), nmiss)
+        n = np.arange(gap.size) - np.repeat(np.cumsum(nmiss) - nmiss, nmiss) + 1
+        trial_end = np.cumsum(sizes) + shift
+        frame_times[np.repeat(trial_end[:-1], nmiss) + n - 1] = (
+            t_last_frame[gap] + intertrial_duration[gap] /
+            (intertrial_missed_frames[gap] + 1) * n)
+        assert _is_strictly_increasing(frame_times)  # negative diffs implies a big problem
         return frame_times
 
 
+@jit(nopython=True, cache=True)
+def _align_timestamps(timestamps, start, count, frate, extrapolate):
+    """
+    Returns the camera timestamps of the frame counts, given the index of the first frame in the
+    timestamps array.  Timestamps missing before the start or after the end of the array are
+    extrapolated at the given frame rate, or set to NaN.
+    :param timestamps: An array of raw FPGA or Bpod camera timestamps
+    :param start: The index of frame 0 in the timestamps array; may be negative
+    :param count: An array of strictly increasing frame numbers
+    :param frate: The frame rate in Hz used for extrapolation
+    :param extrapolate: If False, missing timestamps are NaN
+    :return: An array of timestamps the same size as count
+    """
+    n = timestamps.size
+    ts = np.empty(count.size)
+    for i in range(count.size):
+        j = count[i] + start
+        if 0 <= j < n:
+            ts[i] = timestamps[j]
+        elif not extrapolate:
+            ts[i] = np.nan
+        elif j < 0:  # before the first timestamp
+            ts[i] = timestamps[0] - (1 - j) / frate
+        else:  # after the last timestamp
+            ts[i] = (j - n + 1) / frate + timestamps[n - 1]
+    return ts
+
+
 def align_with_audio(timestamps, audio, pin_state, count,
                      extrapolate_missing=True, display=False):
     """
@@ -306,10 +418,15 @@ def align_with_audio(timestamps, audio, pin_state, count,
     :param display: Plot the resulting timestamps
     :return: The corrected frame timestamps
     """
+    # The alignment kernel below is compiled for contiguous int32 or int64 counts; only other
+    # inputs are converted (frame counts fit in 32 bits) so long recordings aren't copied
+    count = np.asarray(count)
+    if not (count.flags.c_contiguous and count.dtype in (np.int32, np.int64)):
+        count = np.ascontiguousarray(count, dtype=np.int32)
     # Some assertions made on the raw data
     # assert count.size == pin_state.size, 'frame count and pin state size mismatch'
-    assert all(np.diff(count) > 0), 'frame count not strictly increasing'
-    assert all(np.diff(timestamps) > 0), 'FPGA/Bpod camera times not strictly increasing'
+    assert _is_strictly_increasing(count), 'frame count not strictly increasing'
+    assert _is_strictly_increasing(timestamps), 'FPGA/Bpod camera times not strictly increasing'
     same_n_ttl = pin_state['times'].size == audio['times'].size
     assert same_n_ttl, 'more audio TTLs detected on camera than TTLs sent'
 
@@ -346,47 +463,40 @@ def align_with_audio(timestamps, audio, pin_state, count,
     # Minus any frames that were dropped between the start of frame acquisition and the
     # first TTL
     start = first_ttl - first_uptick - (count[first_uptick] - first_uptick)
-    # Get approximate frame rate for extrapolating timestamps (if required)
-    frate = round(1 / np.nanmedian(np.diff(timestamps)))
-
-    if start < 0:
-        n_missing = abs(start)
-        _logger.warning(f'{n_missing} missing FPGA/Bpod timestamp(s) at start; '
+    n_head = max(-start, 0)  # number of missing timestamps at the start
+    n_tail = count[-1] + 1 - (timestamps.size - start)  # number missing at the end
+    assert start < timestamps.size, 'no FPGA/Bpod camera times after first frame'
+    if n_head > 0:
+        _logger.warning(f'{n_head} missing FPGA/Bpod timestamp(s) at start; '
                         f'{"extrapolating" if extrapolate_missing else "prepending nans"}')
-        to_app = (timestamps[0] - (np.arange(n_missing, 0, -1) + 1) / frate
-                  if extrapolate_missing
-                  else np.full(n_missing, np.nan))
-        timestamps = np.r_[to_app, timestamps]  # Prepend the missing times
-        start = 0
-
-    # Remove the extraneous timestamps from the beginning and end
-    end = count[-1] + 1 + start
-    ts = timestamps[start:end]
-    n_missing = count[-1] - ts.size + 1
-    if n_missing > 0:
-        # if (n_missing := count[-1] - ts.size + 1) > 0:  # py3.8
+    if n_tail > 0:
         """
         For ephys sessions there may be fewer FPGA times than frame counts if SpikeGLX is turned
         off before the video acquisition workflow.  For Bpod this always occurs because Bpod
         finishes before the camera workflow.  For Bpod the times are already extrapolated for
         these late frames."""
-        _logger.warning(f'{n_missing} fewer FPGA/Bpod timestamps than frame counts; '
+        _logger.warning(f'{n_tail} fewer FPGA/Bpod timestamps than frame counts; '
                         f'{"extrapolating" if extrapolate_missing else "appending nans"}')
-        to_app = ((np.arange(n_missing, ) + 1) / frate + ts[-1]
-                  if extrapolate_missing
-                  else np.full(n_missing, np.nan))
-        ts = np.r_[ts, to_app]  # Append the missing times
-    assert ts.size >= count.size, 'fewer timestamps than frame counts'
-    assert ts.size == count[-1] + 1, 'more frames recorded in frame count than timestamps '
-
-    # Remove the rest of the dropped frames
-    ts = ts[count]
+    if extrapolate_missing and (n_head > 0 or n_tail > 0):
+        # Get approximate frame rate for extrapolating timestamps
+        frate = round(1 / np.nanmedian(np.diff(timestamps)))
+    else:
+        frate = 0  # unused
+
+    """
+    Remove the extraneous timestamps from the beginning and end, prepend/append any missing
+    timestamps and remove the rest of the dropped frames.  This is done in a single pass over
+    the frame counts without building the intermediate arrays.
+    """
+    ts = _align_timestamps(timestamps, start, count, frate, extrapolate_missing)
     assert np.searchsorted(ts, audio['times'][0]) == first_uptick,\
            'time of first audio TTL doesn\'t match after alignment'
     if ts.size != count.size:
         _logger.error('number of timestamps and frames don\'t match after alignment')
 
     if display:
+        import matplotlib.pyplot as plt
+        from ibllib.plots import vertical_lines
         # Plot to check
         fig, axes = plt.subplots(1, 1)
         y = within_ranges(np.arange(ts.size), pin_state['indices'].reshape(-1, 2)).astype(float)
@@ -400,7 +510,8 @@ def align_with_audio(timestamps, audio, pin_state, count,
     return ts
 
 
-def attribute_times(arr, events, tol=.1, injective=True, take='first'):
+def attribute_times(arr, events, tol=.1, injective=True, take='first',
+                    arr_offset=0., events_offset=0.):
     """
     Returns the values of the first array that correspond to those of the second.
 
@@ -418,20 +529,79 @@ def attribute_times(arr, events, tol=.1, injective=True, take='first'):
     :param injective: If true, once a value has been assigned it will not be assigned again
     :param take: If 'first' the first value within tolerance is assigned; if 'nearest' the
     closest value is assigned
+    :param arr_offset: A value subtracted from `arr` before comparing, e.g. its first time
+    :param events_offset: A value subtracted from `events` before comparing
     :returns Numpy array the same length as `values`
     """
     take = take.lower()
     if take not in ('first', 'nearest'):
         raise ValueError('Parameter `take` must be either "first" or "nearest"')
-    stack = np.ma.masked_invalid(arr, copy=False)
-    stack.fill_value = np.inf
-    assigned = np.full(events.shape, -1, dtype=int)  # Initialize output array
-    for i, x in enumerate(events):
-        dx = np.abs(stack.filled() - x)
-        if dx.min() < tol:  # is any value within tolerance
-            idx = np.where(dx < tol)[0][0] if take == 'first' else dx.argmin()
-            assigned[i] = idx
-            stack.mask[idx] = injective  # If one-to-one, remove the assigned value
+    arr, events = np.asarray(arr), np.asarray(events)
+    # Work on the sorted finite values of arr so that for each event only the values around it
+    # need to be compared, instead of the whole array
+    if np.all(np.isfinite(arr)) and np.all(arr[1:] >= arr[:-1]):
+        # Camera TTL times are usually already finite and sorted: no copy or sort needed
+        isort = np.arange(arr.size)
+        arr_sorted = arr
+    else:
+        ivalid, = np.where(np.isfinite(arr))
+        isort = ivalid[np.argsort(arr[ivalid], kind='stable')]
+        arr_sorted = arr[isort]
+    # Bounds of the values within tolerance of each event; padded by one to allow for rounding
+    # errors as the tolerance test proper is done on the absolute difference below
+    target = events - (events_offset - arr_offset)
+    lo = np.maximum(np.searchsorted(arr_sorted, target - tol) - 1, 0)
+    hi = np.searchsorted(arr_sorted, target + tol, side='right') + 1
+    return _attribute_times(arr_sorted.astype(np.float64, copy=False),
+                            isort.astype(np.int64, copy=False),
+                            events.astype(np.float64, copy=False), lo, hi, float(tol),
+                            bool(injective), take == 'first',
+                            float(arr_offset), float(events_offset))
+
+
+@jit(nopython=True, cache=True)
+def _attribute_times(arr_sorted, isort, events, lo, hi, tol, injective, take_first,
+                     arr_offset, events_offset):
+    """
+    Core of attribute_times.  For each event, the values of arr_sorted between lo and hi are
+    compared and the original index (isort) of the matching value is assigned.
+    :param arr_sorted: the sorted finite values of arr
+    :param isort: the indices of arr_sorted in the original array
+    :param events: an array of event times
+    :param lo: for each event, the index of the first candidate value in arr_sorted
+    :param hi: for each event, the index after the last candidate value in arr_sorted
+    :param tol: the max absolute difference between values in order to be considered a match
+    :param injective: if true, once a value has been assigned it will not be assigned again
+    :param take_first: if true the first value within tolerance is assigned, otherwise the
+    closest value is assigned
+    :param arr_offset: a value subtracted from arr_sorted before comparing
+    :param events_offset: a value subtracted from events before comparing
+    :return: array of indices of arr, -1 where no value was assigned
+    """
+    n = arr_sorted.size
+    used = np.zeros(n, dtype=np.bool_)
+    assigned = np.full(events.size, -1, dtype=np.int64)  # Initialize output array
+    for i in range(events.size):
+        x = events[i] - events_offset
+        best = -1
+        for k in range(lo[i], min(hi[i], n)):
+            if used[k]:
+                continue
+            dx = np.abs((arr_sorted[k] - arr_offset) - x)
+            if not dx < tol:  # not within tolerance
+                continue
+            if best == -1:
+                best = k
+            elif take_first:  # lowest index of the original array
+                if isort[k] < isort[best]:
+                    best = k
+            else:  # smallest difference, then lowest index of the original array
+                dbest = np.abs((arr_sorted[best] - arr_offset) - x)
+                if dx < dbest or (dx == dbest and isort[k] < isort[best]):
+                    best = k
+        if best != -1:
+            assigned[i] = isort[best]
+            used[best] = injective  # If one-to-one, remove the assigned value
     return assigned
 
 
@@ -471,9 +641,9 @@ def groom_pin_state(gpio, audio, ts, tolerance=2., display=False, take='first',
     # make sure first TTL is high
     assert audio['polarities'][0] == 1
     # make sure audio times in order
-    assert np.all(np.diff(audio['times']) > 0)
+    assert _is_strictly_increasing(audio['times'])
     # make sure raw timestamps increase
-    assert np.all(np.diff(ts) > 0), 'timestamps must strictly increase'
+    assert _is_strictly_increasing(ts), 'timestamps must strictly increase'
     # make sure there are state changes
     assert gpio['indices'].any(), 'no TTLs detected in GPIO'
     # # make sure first GPIO state is high
@@ -509,11 +679,15 @@ def groom_pin_state(gpio, audio, ts, tolerance=2., display=False, take='first',
             assert audio_times.size > 0, f'all audio TTLs less than {min_diff}s'
 
         # Onsets
-        ups = ts[low2high] - ts[low2high][0]  # times relative to first GPIO high
-        onsets = audio_times[::2] - audio_times[0]  # audio times relative to first onset
-        # assign GPIO fronts to audio onset
-        assigned = attribute_times(onsets, ups, tol=tolerance, take=take)
-        unassigned = np.setdiff1d(np.arange(onsets.size), assigned[assigned > -1])
+        ups = ts[low2high]
+        onsets = audio_times[::2]
+        # assign GPIO fronts to audio onset, with times relative to the first GPIO high and the
+        # first audio onset respectively
+        assigned = attribute_times(onsets, ups, tol=tolerance, take=take,
+                                   arr_offset=audio_times[0], events_offset=ups[0])
+        unassigned = np.ones(onsets.size, dtype=bool)
+        unassigned[assigned[assigned > -1]] = False
+        unassigned, = np.where(unassigned)
         if unassigned.size > 0:
             _logger.debug(f'{unassigned.size} audio TTL rises were not detected by the camera')
         # Check that all pin state upticks could be attributed to an onset TTL
@@ -523,6 +697,9 @@ def groom_pin_state(gpio, audio, ts, tolerance=2., display=False, take='first',
             _logger.warning(f'{sum(missed)} pin state rises could '
                             f'not be attributed to an audio TTL')
             if display:
+                import matplotlib.pyplot as plt
+                from ibllib.plots import vertical_lines
+                ups, onsets = ups - ups[0], onsets - audio_times[0]
                 ax = plt.subplot()
                 vertical_lines(ups[assigned > -1],
                                linestyle='-', color='g', ax=ax,
@@ -543,10 +720,13 @@ def groom_pin_state(gpio, audio, ts, tolerance=2., display=False, take='first',
         onsets_ = audio_times[::2][assigned]
 
         # Offsets
-        downs = ts[high2low] - ts[high2low][0]
-        offsets = audio_times[1::2] - audio_times[1]
-        assigned = attribute_times(offsets, downs, tol=tolerance, take=take)
-        unassigned = np.setdiff1d(np.arange(onsets.size), assigned[assigned > -1])
+        downs = ts[high2low]
+        offsets = audio_times[1::2]
+        assigned = attribute_times(offsets, downs, tol=tolerance, take=take,
+                                   arr_offset=audio_times[1], events_offset=downs[0])
+        unassigned = np.ones(offsets.size, dtype=bool)
+        unassigned[assigned[assigned > -1]] = False
+        unassigned, = np.where(unassigned)
         if unassigned.size > 0:
             _logger.debug(f'{unassigned.size} audio TTL falls were not detected by the camera')
         # Check that all pin state downticks could be attributed to an offset TTL
@@ -612,13 +792,16 @@ def groom_pin_state(gpio, audio, ts, tolerance=2., display=False, take='first',
     gpio['times'] = fcn_a2b(ts[ifronts])
 
     if display:
+        import matplotlib.pyplot as plt
+        from ibllib.plots import squares
         # Plot all the onsets and offsets
         ax = plt.subplot()
         # All Audio TTLS
         squares(audio['times'], audio['polarities'],
                 ax=ax, label='audio TTLs', linestyle=':', color='k', yrange=[0, 1], alpha=0.3)
         # GPIO
-        x = np.insert(gpio['times'], 0, 0)
+        x = np.zeros(gpio['times'].size + 1, dtype=gpio['times'].dtype)  # prepend a zero
+        x[1:] = gpio['times']
         y = np.arange(x.size) % 2
         squares(x, y, ax=ax, label='GPIO')
         y = within_ranges(np.arange(ts.size), ifronts.reshape(-1, 2))  # 0 or 1 for each frame
@@ -657,10 +840,29 @@ def extract_all(session_path, session_type=None, save=True, **kwargs):
         if 'sync' not in kwargs:
             kwargs['sync'], kwargs['chmap'] = \
                 get_main_probe_sync(session_path, bin_exists=kwargs.pop('bin_exists', False))
+        if len(labels) > 1 and 'audio' not in kwargs:
+            # Extract the audio fronts once for all cameras
+            kwargs['audio'] = _get_sync_fronts(kwargs['sync'], kwargs['chmap']['audio'])
     else:  # assume Bpod otherwise
         assert kwargs.pop('labels', 'left'), 'only left camera is currently supported'
         extractor = CameraTimestampsBpod
 
-    outputs, files = run_extractor_classes(
-        extractor, session_path=session_path, save=save, **kwargs)
+    run = partial(run_extractor_classes, session_path=session_path, save=save, **kwargs)
+    # The extractor instances each set the logger level and restore it on deletion; when several
+    # exist at once they restore one another's level, so restore the original level here
+    log_level = _logger.level
+    try:
+        if isinstance(extractor, list) and len(extractor) > 1 and not kwargs.get('display'):
+            # The cameras are independent, so extract them concurrently.  Most of the work
+            # (video and file I/O, numpy and numba routines) releases the GIL
+            with ThreadPoolExecutor(max_workers=len(extractor)) as executor:
+                results = list(executor.map(run, extractor))  # results in label order
+            outputs, files = OrderedDict(), []
+            for out, fil in results:
+                outputs.update(out)
+                files.extend(fil)
+        else:
+            outputs, files = run(extractor)
+    finally:
+        _logger.setLevel(log_level)
     return outputs, files
@@ -4,6 +4,7 @@
 # @Date: Monday, September 7th 2020, 11:51:17 am
 import json
 import logging
+from functools import lru_cache
 from pathlib import Path
 from typing import Tuple
 
@@ -11,6 +12,8 @@ import ibllib.io.raw_data_loaders as rawio
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
+from numba import jit
+from brainbox.core import Bunch
 from ibllib.io.extractors import ephys_fpga
 from ibllib.io.extractors.base import BaseExtractor
 from ibllib.io.extractors.passive_plotting import (
@@ -33,6 +36,7 @@ NGABOR = 20 + 20 * 4 * 2  # number of expected Gabor patches
 NTONES = 40
 NNOISES = 40
 DEBUG_PLOTS = False
+_FIXTURE_DIR = Path(ephys_fpga.__file__).parent.joinpath("ephys_sessions")
 
 dataset_types = [
     "_spikeglx_sync.times",
@@ -68,25 +72,41 @@ def _load_passive_session_fixtures(session_path: str) -> dict:
     """
     settings = rawio.load_settings(session_path)
     ses_nb = settings["SESSION_ORDER"][settings["SESSION_IDX"]]
-    path_fixtures = Path(ephys_fpga.__file__).parent.joinpath("ephys_sessions")
+    return _load_fixture_by_nb(ses_nb)
 
+
+@lru_cache(maxsize=16)
+def _load_fixture_by_nb(ses_nb: int) -> dict:
+    """_load_fixture_by_nb Loads the ephys session fixtures of a session number, once per process
+
+    :param ses_nb: the ephys session number
+    :type ses_nb: int
+    :return: position contrast phase delays and stim id's, as read-only arrays
+    :rtype: dict
+    """
+    # Memory-mapped read-only: only the pages actually used are read, and the arrays are safely
+    # shared between callers
     fixture = {
-        "pcs": np.load(path_fixtures.joinpath(f"session_{ses_nb}_passive_pcs.npy")),
-        "delays": np.load(path_fixtures.joinpath(f"session_{ses_nb}_passive_stimDelays.npy")),
-        "ids": np.load(path_fixtures.joinpath(f"session_{ses_nb}_passive_stimIDs.npy")),
+        "pcs": np.load(_FIXTURE_DIR.joinpath(f"session_{ses_nb}_passive_pcs.npy"),
+                       mmap_mode="r"),
+        "delays": np.load(_FIXTURE_DIR.joinpath(f"session_{ses_nb}_passive_stimDelays.npy"),
+                          mmap_mode="r"),
+        "ids": np.load(_FIXTURE_DIR.joinpath(f"session_{ses_nb}_passive_stimIDs.npy"),
+                       mmap_mode="r"),
     }
 
     return fixture
 
 
+@lru_cache(maxsize=1)
 def _load_passive_stim_meta() -> dict:
-    """load_passive_stim_meta Loads the passive protocol metadata
+    """load_passive_stim_meta Loads the passive protocol metadata, once per process
 
-    :return: metadata about passive protocol stimulus presentation
+    :return: metadata about passive protocol stimulus presentation; this dict is shared between
+     callers and should not be modified
     :rtype: dict
     """
-    path_fixtures = Path(ephys_fpga.__file__).parent.joinpath("ephys_sessions")
-    with open(path_fixtures.joinpath("passive_stim_meta.json"), "r") as f:
+    with open(_FIXTURE_DIR.joinpath("passive_stim_meta.json"), "r") as f:
         meta = json.load(f)
 
     return meta
@@ -130,13 +150,30 @@ def _get_spacer_times(spacer_template, jitter, ttl_signal, t_quiet):
     ts_spacer_middle = ttl_signal[idxs_spacer_middle]
     # put beginning/end of spacer times into an array
     spacer_length = np.max(spacer_template)
-    spacer_times = np.zeros(shape=(ts_spacer_middle.shape[0], 2))
-    for i, t in enumerate(ts_spacer_middle):
-        spacer_times[i, 0] = t - (spacer_length / 2) - t_quiet
-        spacer_times[i, 1] = t + (spacer_length / 2) + t_quiet
+    spacer_times = np.column_stack((
+        ts_spacer_middle - (spacer_length / 2) - t_quiet,
+        ts_spacer_middle + (spacer_length / 2) + t_quiet,
+    ))
     return spacer_times, conv_dttl
 
 
+@lru_cache(maxsize=1)
+def _get_spacer_template():
+    """
+    Spacer template (in seconds), quiet time around the spacers and expected number of spacers,
+    from the passive protocol metadata
+    returns spacer_template, t_quiet, n_exp_spacer
+    """
+    meta = _load_passive_stim_meta()
+    spacer_template = (
+        np.array(meta["VISUAL_STIM_0"]["ttl_frame_nums"], dtype=np.float32) / FRAME_FS
+    )
+    spacer_template.setflags(write=False)  # shared between calls
+    t_quiet = meta["VISUAL_STIM_0"]["delay_around"]
+    n_exp_spacer = np.count_nonzero(np.array(meta["STIM_ORDER"]) == 0)  # Hardcoded 0 for spacer
+    return spacer_template, t_quiet, n_exp_spacer
+
+
 def _get_passive_spacers(session_path, sync=None, sync_map=None):
     """
     load and get spacer information, do corr to find spacer timestamps
@@ -144,20 +181,15 @@ def _get_passive_spacers(session_path, sync=None, sync_map=None):
     """
     if sync is None or sync_map is None:
         sync, sync_map = ephys_fpga.get_main_probe_sync(session_path, bin_exists=False)
-    meta = _load_passive_stim_meta()
     # t_end_ephys = passive.ephysCW_end(session_path=session_path)
     fttl = ephys_fpga._get_sync_fronts(sync, sync_map["frame2ttl"], tmin=None)
-    spacer_template = (
-        np.array(meta["VISUAL_STIM_0"]["ttl_frame_nums"], dtype=np.float32) / FRAME_FS
-    )
+    spacer_template, t_quiet, n_exp_spacer = _get_spacer_template()
     jitter = 3 / FRAME_FS  # allow for 3 screen refresh as jitter
-    t_quiet = meta["VISUAL_STIM_0"]["delay_around"]
     spacer_times, _ = _get_spacer_times(
         spacer_template=spacer_template, jitter=jitter, ttl_signal=fttl["times"], t_quiet=t_quiet
     )
 
     # Check correct number of spacers found
-    n_exp_spacer = np.sum(np.array(meta["STIM_ORDER"]) == 0)  # Hardcoded 0 for spacer
     if n_exp_spacer != np.size(spacer_times) / 2:
         raise ValueError(
             f"The number of expected spacer ({n_exp_spacer}) "
@@ -240,22 +272,66 @@ def _reshape_RF(RF_file, meta_stim):
 
 
 # 3/3 Replay of task stimuli
+@jit(nopython=True, cache=True)
+def _gabor_diff_range(times):
+    """
+    Min and max of the alternating frame2ttl intervals in a single pass, trimming the edges.
+    Equivalent to, with d = np.diff(times):
+    min(d[2:-2:2]), max(d[2:-1:2]), min(d[3:-2:2]), max(d[3:-1:2])
+    :param times: frame2ttl front times, at least 7
+    :return: min0, max0, min1, max1
+    """
+    n = times.size - 1  # number of intervals
+    min0 = max0 = times[3] - times[2]
+    min1 = max1 = times[4] - times[3]
+    for i in range(2, n - 1):
+        d = times[i + 1] - times[i]
+        if i % 2 == 0:
+            max0 = max(max0, d)
+            if i < n - 2:
+                min0 = min(min0, d)
+        else:
+            max1 = max(max1, d)
+            if i < n - 2:
+                min1 = min(min1, d)
+    return min0, max0, min1, max1
+
+
+@jit(nopython=True, cache=True)
+def _gabor_pulse_starts(times, thresh):
+    """
+    Indices of the frame2ttl intervals shorter than thresh and longer than 100ms
+    :param times: frame2ttl front times
+    :param thresh: the min length of the intervals between pulses
+    :return: indices of the pulse onsets
+    """
+    idx = np.empty(max(times.size - 1, 0), dtype=np.int64)
+    n = 0
+    for i in range(times.size - 1):
+        d = times[i + 1] - times[i]
+        if d < thresh and d > 0.1:
+            idx[n] = i
+            n += 1
+    return idx[:n]
+
+
 def _extract_passiveGabor_df(fttl: dict, session_path: str) -> pd.DataFrame:
     # At this stage we want to define what pulses are and not quality control them.
     # Pulses are stricty altternating with intevals
     # find min max lengths for both (we don'tknow which are pulses and which are intervals yet)
     # trim edges of pulses
-    diff0 = (np.min(np.diff(fttl["times"])[2:-2:2]), np.max(np.diff(fttl["times"])[2:-1:2]))
-    diff1 = (np.min(np.diff(fttl["times"])[3:-2:2]), np.max(np.diff(fttl["times"])[3:-1:2]))
+    times = np.asarray(fttl["times"], dtype=np.float64)
+    if times.size < 7:
+        raise ValueError("Not enough frame2ttl fronts to detect Gabor pulses")
+    min0, max0, min1, max1 = _gabor_diff_range(times)
+    diff0, diff1 = (min0, max0), (min1, max1)
     # Highest max is of the intervals
     if max(diff0 + diff1) in diff0:
         thresh = diff0[0]
     elif max(diff0 + diff1) in diff1:
         thresh = diff1[0]
     # Anything lower than the min length of intervals is a pulse
-    idx_start_stims = np.where((np.diff(fttl["times"]) < thresh) & (np.diff(fttl["times"]) > 0.1))[
-        0
-    ]
+    idx_start_stims = _gabor_pulse_starts(times, thresh)
     # Check if any pulse has been missed
     # i.e. expected lenght (without first puls) and that it's alternating
     if len(idx_start_stims) < NGABOR - 1 and np.any(np.diff(idx_start_stims) > 2):
@@ -273,64 +349,79 @@ def _extract_passiveGabor_df(fttl: dict, session_path: str) -> pd.DataFrame:
     if len(start_times) < NGABOR:
         first_stim_off_idx = idx_start_stims[0] - 1
         # first_stim_on_idx = first_stim_off_idx - 1
-        end_times = np.insert(end_times, 0, fttl["times"][first_stim_off_idx])
-        start_times = np.insert(start_times, 0, end_times[0] - 0.3)
+        # prepend the first stim to the start and end times
+        end_times_ = np.empty(end_times.size + 1, dtype=end_times.dtype)
+        end_times_[0] = fttl["times"][first_stim_off_idx]
+        end_times_[1:] = end_times
+        start_times_ = np.empty(start_times.size + 1, dtype=start_times.dtype)
+        start_times_[0] = end_times_[0] - 0.3
+        start_times_[1:] = start_times
+        start_times, end_times = start_times_, end_times_
 
-    # intervals dstype requires reshaping of start and end times
-    passiveGabor_intervals = np.array([(x, y) for x, y in zip(start_times, end_times)])
+    assert (
+        len(start_times) == NGABOR
+    ), f"Wrong number of Gabor stimuli detected: {len(start_times)} / {NGABOR}"
 
     # Check length of presentation of stim is  within 150msof expected
-    if not np.allclose([y - x for x, y in passiveGabor_intervals], 0.3, atol=0.15):
+    if not np.allclose(end_times - start_times, 0.3, atol=0.15):
         log.warning("Some Gabor presentation lengths seem wrong.")
-
-    assert (
-        len(passiveGabor_intervals) == NGABOR
-    ), f"Wrong number of Gabor stimuli detected: {len(passiveGabor_intervals)} / {NGABOR}"
     fixture = _load_passive_session_fixtures(session_path)
     passiveGabor_properties = fixture["pcs"]
-    passiveGabor_table = np.append(passiveGabor_intervals, passiveGabor_properties, axis=1)
-    columns = ["start", "stop", "position", "contrast", "phase"]
-    passiveGabor_df = pd.DataFrame(passiveGabor_table, columns=columns)
+    # The fixture arrays are shared and read-only: let the DataFrame copy the columns.  Each
+    # column keeps its own dtype, the properties are not promoted to the float64 of the times
+    passiveGabor_df = pd.DataFrame({
+        "start": start_times,
+        "stop": end_times,
+        "position": passiveGabor_properties[:, 0],
+        "contrast": passiveGabor_properties[:, 1],
+        "phase": passiveGabor_properties[:, 2],
+    })
     return passiveGabor_df
 
 
+def _alternating_fronts(polarities: np.array) -> bool:
+    """Whether the fronts alternate between rising and falling, starting with a rising front"""
+    return bool(np.all(polarities[0::2] > 0) and np.all(polarities[1::2] < 0))
+
+
 def _extract_passiveValve_intervals(bpod: dict) -> np.array:
     # passiveValve.intervals
     # Get valve intervals from bpod channel
     # bpod channel should only contain valve output for passiveCW protocol
     # All high fronts == valve open times and low fronts == valve close times
-    valveOn_times = bpod["times"][bpod["polarities"] > 0]
-    valveOff_times = bpod["times"][bpod["polarities"] < 0]
-
-    assert len(valveOn_times) == NVALVE, "Wrong number of valve ONSET times"
-    assert len(valveOff_times) == NVALVE, "Wrong number of valve OFFSET times"
     assert len(bpod["times"]) == NVALVE * 2, "Wrong number of valve FRONTS detected"  # (40 * 2)
+    # Fronts alternate starting with an onset, so they are split with slices
+    assert _alternating_fronts(bpod["polarities"]), "Valve ONSET and OFFSET fronts not alternating"
+    valveOn_times = bpod["times"][0::2]
+    valveOff_times = bpod["times"][1::2]
 
     # check all values are within bpod tolerance of 100µs
+    valve_durations = valveOff_times - valveOn_times
     assert np.allclose(
-        valveOff_times - valveOn_times, valveOff_times[0] - valveOn_times[0], atol=0.0001
+        valve_durations, valve_durations[0], atol=0.0001
     ), "Some valve outputs are longer or shorter than others"
 
-    return np.array([(x, y) for x, y in zip(valveOn_times, valveOff_times)])
+    return np.column_stack((valveOn_times, valveOff_times))
 
 
 def _extract_passiveAudio_intervals(audio: dict) -> Tuple[np.array, np.array]:
     # Get Tone and Noise cue intervals
 
-    # Get all sound onsets and offsets
-    soundOn_times = audio["times"][audio["polarities"] > 0]
-    soundOff_times = audio["times"][audio["polarities"] < 0]
-    # Check they are the correct number
-    assert len(soundOn_times) == NTONES + NNOISES, "Wrong number of sound ONSETS"
-    assert len(soundOff_times) == NTONES + NNOISES, "Wrong number of sound OFFSETS"
+    # Get all sound onsets and offsets, checking they are the correct number
+    assert len(audio["times"]) == (NTONES + NNOISES) * 2, "Wrong number of sound FRONTS"
+    assert _alternating_fronts(audio["polarities"]), "Sound ONSETS and OFFSETS not alternating"
+    soundOn_times = audio["times"][0::2]
+    soundOff_times = audio["times"][1::2]
 
     diff = soundOff_times - soundOn_times
     # Tone is ~100ms so check if diff < 0.3
-    toneOn_times = soundOn_times[diff <= 0.3]
-    toneOff_times = soundOff_times[diff <= 0.3]
+    is_tone = diff <= 0.3
+    toneOn_times = np.compress(is_tone, soundOn_times)
+    toneOff_times = np.compress(is_tone, soundOff_times)
     # Noise is ~500ms so check if diff > 0.3
-    noiseOn_times = soundOn_times[diff > 0.3]
-    noiseOff_times = soundOff_times[diff > 0.3]
+    is_noise = ~is_tone
+    noiseOn_times = np.compress(is_noise, soundOn_times)
+    noiseOff_times = np.compress(is_noise, soundOff_times)
 
     assert len(toneOn_times) == NTONES
     assert len(toneOff_times) == NTONES
@@ -338,19 +429,13 @@ def _extract_passiveAudio_intervals(audio: dict) -> Tuple[np.array, np.array]:
     assert len(noiseOff_times) == NNOISES
 
     # Fixed delays from soundcard ~500µs
-    np.allclose(toneOff_times - toneOn_times, 0.1, atol=0.0006)
-    np.allclose(noiseOff_times - noiseOn_times, 0.5, atol=0.0006)
+    if not np.allclose(toneOff_times - toneOn_times, 0.1, atol=0.0006):
+        log.warning("Some tone lengths seem wrong.")
+    if not np.allclose(noiseOff_times - noiseOn_times, 0.5, atol=0.0006):
+        log.warning("Some noise lengths seem wrong.")
 
-    passiveTone_intervals = np.append(
-        toneOn_times.reshape((len(toneOn_times), 1)),
-        toneOff_times.reshape((len(toneOff_times), 1)),
-        axis=1,
-    )
-    passiveNoise_intervals = np.append(
-        noiseOn_times.reshape((len(noiseOn_times), 1)),
-        noiseOff_times.reshape((len(noiseOff_times), 1)),
-        axis=1,
-    )
+    passiveTone_intervals = np.column_stack((toneOn_times, toneOff_times))
+    passiveNoise_intervals = np.column_stack((noiseOn_times, noiseOff_times))
     return passiveTone_intervals, passiveNoise_intervals
 
 
@@ -397,7 +482,6 @@ def extract_rfmapping(
     RF_file = Path().joinpath(session_path, "raw_passive_data", "_iblrig_RFMapStim.raw.bin")
     passiveRFM_frames, RF_ttl_trace = _reshape_RF(RF_file=RF_file, meta_stim=meta[mkey])
     rf_id_up, rf_id_dw, RF_n_ttl_expected = _get_id_raisefall_from_analogttl(RF_ttl_trace)
-    meta[mkey]["ttl_num"] = RF_n_ttl_expected
     rf_times_on_idx = np.where(np.diff(fttl["times"]) < 1)[0]
     rf_times_off_idx = rf_times_on_idx + 1
     RF_times = fttl["times"][np.sort(np.concatenate([rf_times_on_idx, rf_times_off_idx]))]
@@ -414,30 +498,58 @@ def extract_rfmapping(
     return passiveRFM_times  # _ibl_passiveRFM.times.npy
 
 
-def extract_task_replay(
-    session_path: str, sync: dict = None, sync_map: dict = None, treplay: np.array = None
-) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    if sync is None or sync_map is None:
-        sync, sync_map = ephys_fpga.get_main_probe_sync(session_path, bin_exists=False)
-
-    if treplay is None:
-        passivePeriods_df = extract_passive_periods(session_path, sync=sync, sync_map=sync_map)
-        treplay = passivePeriods_df.taskReplay.values
-
-    fttl = ephys_fpga._get_sync_fronts(sync, sync_map["frame2ttl"], tmin=treplay[0])
+def _extract_task_replay(
+    session_path: str, sync: dict, sync_map: dict, treplay: np.array, fronts: dict = None
+) -> Tuple[pd.DataFrame, np.array, np.array, np.array]:
+    """
+    Extracts the task replay stimuli, scanning the sync of each device once from the start of
+    the task replay period
+    :param fronts: optional dict of the full sync fronts of each device, which are then trimmed
+     instead of scanning the sync again
+    :return: Gabor table, valve, tone and noise intervals
+    """
+    def replay_fronts(device):
+        if fronts is None:
+            return ephys_fpga._get_sync_fronts(sync, sync_map[device], tmin=treplay[0])
+        # The sync times are sorted: the fronts from tmin on are a slice
+        first = np.searchsorted(fronts[device]["times"], treplay[0]) if treplay[0] else 0
+        return Bunch({"times": fronts[device]["times"][first:],
+                      "polarities": fronts[device]["polarities"][first:]})
+
+    fttl = replay_fronts("frame2ttl")
     passiveGabor_df = _extract_passiveGabor_df(fttl, session_path)
 
-    bpod = ephys_fpga._get_sync_fronts(sync, sync_map["bpod"], tmin=treplay[0])
+    bpod = replay_fronts("bpod")
     passiveValve_intervals = _extract_passiveValve_intervals(bpod)
 
-    audio = ephys_fpga._get_sync_fronts(sync, sync_map["audio"], tmin=treplay[0])
+    audio = replay_fronts("audio")
     passiveTone_intervals, passiveNoise_intervals = _extract_passiveAudio_intervals(audio)
+    return passiveGabor_df, passiveValve_intervals, passiveTone_intervals, passiveNoise_intervals
+
 
+def _passive_stims_table(
+    passiveValve_intervals: np.array, passiveTone_intervals: np.array,
+    passiveNoise_intervals: np.array
+) -> pd.DataFrame:
     passiveStims_df = np.concatenate(
         [passiveValve_intervals, passiveTone_intervals, passiveNoise_intervals], axis=1
     )
     columns = ["valveOn", "valveOff", "toneOn", "toneOff", "noiseOn", "noiseOff"]
-    passiveStims_df = pd.DataFrame(passiveStims_df, columns=columns)
+    return pd.DataFrame(passiveStims_df, columns=columns)
+
+
+def extract_task_replay(
+    session_path: str, sync: dict = None, sync_map: dict = None, treplay: np.array = None
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    if sync is None or sync_map is None:
+        sync, sync_map = ephys_fpga.get_main_probe_sync(session_path, bin_exists=False)
+
+    if treplay is None:
+        passivePeriods_df = extract_passive_periods(session_path, sync=sync, sync_map=sync_map)
+        treplay = passivePeriods_df.taskReplay.values
+
+    passiveGabor_df, *intervals = _extract_task_replay(session_path, sync, sync_map, treplay)
+    passiveStims_df = _passive_stims_table(*intervals)
     return (
         passiveGabor_df,
         passiveStims_df,
@@ -455,8 +567,9 @@ def extract_replay_debug(
     if sync is None or sync_map is None:
         sync, sync_map = ephys_fpga.get_main_probe_sync(session_path, bin_exists=False)
 
+    # The passive periods are plotted so they are extracted even if treplay is provided
+    passivePeriods_df = extract_passive_periods(session_path, sync=sync, sync_map=sync_map)
     if treplay is None:
-        passivePeriods_df = extract_passive_periods(session_path, sync=sync, sync_map=sync_map)
         treplay = passivePeriods_df.taskReplay.values
 
     if ax is None:
@@ -464,30 +577,27 @@ def extract_replay_debug(
 
     f = ax.figure
     f.suptitle("/".join(str(session_path).split("/")[-5:]))
-    plot_sync_channels(sync=sync, sync_map=sync_map, ax=ax)
-
-    passivePeriods_df = extract_passive_periods(session_path, sync=sync, sync_map=sync_map)
-    treplay = passivePeriods_df.taskReplay.values
-
+    # Scan the sync once per device for both the plot and the task replay extraction
+    fronts = {
+        device: ephys_fpga._get_sync_fronts(sync, sync_map[device])
+        for device in ("frame2ttl", "audio", "bpod")
+    }
+    plot_sync_channels(sync=sync, sync_map=sync_map, ax=ax, fronts=fronts)
     plot_passive_periods(passivePeriods_df, ax=ax)
 
-    fttl = ephys_fpga._get_sync_fronts(sync, sync_map["frame2ttl"], tmin=treplay[0])
-    passiveGabor_df = _extract_passiveGabor_df(fttl, session_path)
+    (
+        passiveGabor_df,
+        passiveValve_intervals,
+        passiveTone_intervals,
+        passiveNoise_intervals,
+    ) = _extract_task_replay(session_path, sync, sync_map, treplay, fronts=fronts)
     plot_gabor_times(passiveGabor_df, ax=ax)
-
-    bpod = ephys_fpga._get_sync_fronts(sync, sync_map["bpod"], tmin=treplay[0])
-    passiveValve_intervals = _extract_passiveValve_intervals(bpod)
     plot_valve_times(passiveValve_intervals, ax=ax)
-
-    audio = ephys_fpga._get_sync_fronts(sync, sync_map["audio"], tmin=treplay[0])
-    passiveTone_intervals, passiveNoise_intervals = _extract_passiveAudio_intervals(audio)
     plot_audio_times(passiveTone_intervals, passiveNoise_intervals, ax=ax)
 
-    passiveStims_df = np.concatenate(
-        [passiveValve_intervals, passiveTone_intervals, passiveNoise_intervals], axis=1
+    passiveStims_df = _passive_stims_table(
+        passiveValve_intervals, passiveTone_intervals, passiveNoise_intervals
     )
-    columns = ["valveOn", "valveOff", "toneOn", "toneOff", "noiseOn", "noiseOff"]
-    passiveStims_df = pd.DataFrame(passiveStims_df, columns=columns)
 
     return (
         passiveGabor_df,
@@ -524,7 +634,7 @@ class PassiveChoiceWorld(BaseExtractor):
             trfm = passivePeriods_df.RFM.values
             treplay = passivePeriods_df.taskReplay.values
 
-        except BaseException as e:
+        except Exception as e:
             log.error(f"Failed to extract passive periods: {e}")
             passivePeriods_df = None
             trfm = None
@@ -559,6 +669,10 @@ class PassiveChoiceWorld(BaseExtractor):
             plot_gabor_times(passiveGabor_df, ax=ax)
             plot_stims_times(passiveStims_df, ax=ax)
             plt.show()
+            # Outside of interactive mode show has blocked until the window was closed, or
+            # is a no-op on non-GUI backends: release the figure
+            if not plt.isinteractive():
+                plt.close(f)
 
         return (
             passivePeriods_df,  # _ibl_passivePeriods.intervalsTable.csv
@@ -20,12 +20,16 @@ def plot_rfmapping(times_interp_RF, ax=None):
     ax.legend()
 
 
-def plot_sync_channels(sync, sync_map, ax=None):
+def plot_sync_channels(sync, sync_map, ax=None, fronts=None):
     # Plot all sync pulses
+    # fronts: optional dict of the already extracted sync fronts of each device
     if ax is None:
         f, ax = plt.subplots(1, 1)
     for i, device in enumerate(["frame2ttl", "audio", "bpod"]):
-        sy = ephys_fpga._get_sync_fronts(sync, sync_map[device])  # , tmin=t_start_passive)
+        if fronts is not None and device in fronts:
+            sy = fronts[device]
+        else:
+            sy = ephys_fpga._get_sync_fronts(sync, sync_map[device])  # , tmin=t_start_passive)
         squares(sy["times"], sy["polarities"], yrange=[0.1 + i, 0.9 + i], color="k", ax=ax)
 
 
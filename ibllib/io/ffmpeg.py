@@ -1,4 +1,6 @@
 from pathlib import Path
+import json
+import shutil
 import subprocess
 import logging
 
@@ -68,3 +70,30 @@ def iblrig_video_compression(session_path, command):
     for file_in in rig_avi_files:
         file_in.unlink()
     return output_files
+
+
+def get_frame_count(video_path):
+    """
+    Returns the number of frames of the first video stream, as reported by the container
+    metadata.  This runs ffprobe, which reads the file header without decoding any frames.
+    :param video_path: full file path of the video
+    :return: the number of frames, or None if ffprobe is not installed, fails or times out, or
+    the container doesn't report the number of frames
+    """
+    if shutil.which('ffprobe') is None:
+        return
+    command = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+               '-show_entries', 'stream=nb_frames', '-of', 'json', str(video_path)]
+    try:
+        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                 timeout=30)
+    except subprocess.TimeoutExpired:
+        _logger.debug(f'ffprobe timed out for {video_path}')
+        return
+    if process.returncode != 0:
+        _logger.debug(f'ffprobe failed for {video_path}: {process.stderr}')
+        return
+    try:
+        return int(json.loads(process.stdout)['streams'][0]['nb_frames'])
+    except (KeyError, IndexError, ValueError):
+        return
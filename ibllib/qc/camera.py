@@ -188,7 +188,7 @@ class CameraQC(base.QC):
             audio_ttls = ephys_fpga._get_sync_fronts(sync, chmap['audio'])
             self.data['audio'] = audio_ttls['times']  # Get rises
             # Load raw FPGA times
-            cam_ts = extract_camera_sync(sync, chmap)
+            cam_ts = extract_camera_sync(sync, chmap, labels=self.side)
             self.data['fpga_times'] = cam_ts[self.side]
         else:
             bpod_data = raw.load_data(self.session_path)
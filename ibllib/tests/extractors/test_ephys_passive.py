@@ -16,6 +16,13 @@ class TestsPassiveExtractor(unittest.TestCase):
         meta = passive._load_passive_stim_meta()
         self.assertTrue(isinstance(meta, dict))
 
+    def test_load_fixture_by_nb(self):
+        fixture = passive._load_fixture_by_nb(0)
+        self.assertEqual(fixture["pcs"].shape, (passive.NGABOR, 3))
+        self.assertFalse(any(arr.flags.writeable for arr in fixture.values()))
+        # The fixtures are read from disk only once
+        self.assertIs(fixture, passive._load_fixture_by_nb(0))
+
     def test_interpolate_rf_mapping_stimulus(self):
         idxs_up = np.array([0, 4, 8])
         idxs_dn = np.array([1, 5, 9])
@@ -27,5 +34,63 @@ class TestsPassiveExtractor(unittest.TestCase):
         )
         self.assertTrue(np.array_equal(Tq, Xq))
 
+    def test_alternating_fronts(self):
+        self.assertTrue(passive._alternating_fronts(np.array([1, -1, 1, -1])))
+        self.assertTrue(passive._alternating_fronts(np.array([1, -1, 1])))
+        # Starting with a falling front
+        self.assertFalse(passive._alternating_fronts(np.array([-1, 1, -1, 1])))
+        # Two rising fronts in a row
+        self.assertFalse(passive._alternating_fronts(np.array([1, -1, 1, 1, -1, -1])))
+
+    def test_extract_passiveValve_intervals(self):
+        onsets = np.arange(passive.NVALVE) * 2.
+        times = np.column_stack((onsets, onsets + .1)).ravel()
+        polarities = np.tile([1, -1], passive.NVALVE)
+        intervals = passive._extract_passiveValve_intervals(
+            {"times": times, "polarities": polarities})
+        np.testing.assert_array_equal(intervals, np.c_[onsets, onsets + .1])
+        # Fronts that don't alternate
+        with self.assertRaises(AssertionError):
+            passive._extract_passiveValve_intervals(
+                {"times": times, "polarities": np.roll(polarities, 1)})
+        # Wrong number of fronts
+        with self.assertRaises(AssertionError):
+            passive._extract_passiveValve_intervals(
+                {"times": times[:-2], "polarities": polarities[:-2]})
+        # A valve opening longer than the others
+        times[-1] += .001
+        with self.assertRaises(AssertionError):
+            passive._extract_passiveValve_intervals({"times": times, "polarities": polarities})
+
+    def test_extract_passiveAudio_intervals(self):
+        nsounds = passive.NTONES + passive.NNOISES
+        onsets = np.arange(nsounds) * 2.
+        is_tone = np.arange(nsounds) % 2 == 0  # interleave tones and noises
+        offsets = onsets + np.where(is_tone, .1, .5)
+        audio = {"times": np.column_stack((onsets, offsets)).ravel(),
+                 "polarities": np.tile([1, -1], nsounds)}
+        tones, noises = passive._extract_passiveAudio_intervals(audio)
+        np.testing.assert_array_equal(tones, np.c_[onsets[is_tone], offsets[is_tone]])
+        np.testing.assert_array_equal(noises, np.c_[onsets[~is_tone], offsets[~is_tone]])
+        # Fronts that don't alternate
+        audio["polarities"] = -audio["polarities"]
+        with self.assertRaises(AssertionError):
+            passive._extract_passiveAudio_intervals(audio)
+
+    def test_gabor_kernels(self):
+        rng = np.random.default_rng(0)
+        # Odd and even numbers of fronts, including the minimum of 7
+        for n in (7, 8, 9, 50, 51):
+            times = np.cumsum(rng.uniform(0.05, 1.5, n))
+            d = np.diff(times)
+            expected = (d[2:-2:2].min(), d[2:-1:2].max(), d[3:-2:2].min(), d[3:-1:2].max())
+            self.assertEqual(passive._gabor_diff_range(times), expected)
+            for thresh in (0.5, 1., 2.):
+                idx, = np.where((d < thresh) & (d > 0.1))
+                np.testing.assert_array_equal(passive._gabor_pulse_starts(times, thresh), idx)
+        # Too few fronts to trim the edges
+        with self.assertRaises(ValueError):
+            passive._extract_passiveGabor_df({"times": np.arange(6.)}, None)
+
     def tearDown(self):
         pass
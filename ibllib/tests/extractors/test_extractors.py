@@ -1,8 +1,10 @@
 import functools
 import logging
 import shutil
+import time
 import tempfile
 import unittest
+from unittest.mock import patch
 from pathlib import Path
 
 import numpy as np
@@ -729,6 +731,50 @@ class TestCameraExtractors(unittest.TestCase):
         self.assertTrue(np.all(gpio_['times'] == audio_['times']))
         self.assertTrue(np.all(gpio_['times'] == np.array([41., 41.3])))
 
+    def test_align_with_audio(self):
+        fps = 50
+        full = 100 + np.arange(120) / fps  # camera times without any missing
+        count = np.delete(np.arange(100), [10, 11])  # frame counter with two dropped frames
+        # First pin state change on the 21st frame received, i.e. frame number 22
+        pin_state = {'indices': np.array([20, 21]), 'times': np.array([0., 1.])}
+        audio = {'times': full[22] - 1e-3 + np.array([0., .3]), 'polarities': np.array([1, -1])}
+
+        # Dropped frames are removed from the timestamps
+        ts = camera.align_with_audio(full, audio, pin_state, count)
+        np.testing.assert_array_equal(ts, full[count])
+
+        # Missing timestamps at the start are extrapolated (two frame periods before the first
+        # received timestamp) or are NaNs
+        timestamps = full[5:]
+        expected = full[count]
+        expected[:5] = timestamps[0] - np.arange(6, 1, -1) / fps
+        ts = camera.align_with_audio(timestamps, audio, pin_state, count)
+        np.testing.assert_allclose(ts, expected)
+        ts = camera.align_with_audio(timestamps, audio, pin_state, count,
+                                     extrapolate_missing=False)
+        self.assertTrue(np.all(np.isnan(ts[:5])))
+        np.testing.assert_array_equal(ts[5:], full[count[5:]])
+
+        # Missing timestamps at the end are extrapolated or are NaNs
+        timestamps = full[:90]
+        n_tail = np.sum(count >= 90)
+        expected = full[count]
+        expected[-n_tail:] = timestamps[-1] + np.arange(1, n_tail + 1) / fps
+        ts = camera.align_with_audio(timestamps, audio, pin_state, count)
+        np.testing.assert_allclose(ts, expected)
+        ts = camera.align_with_audio(timestamps, audio, pin_state, count,
+                                     extrapolate_missing=False)
+        self.assertTrue(np.all(np.isnan(ts[-n_tail:])))
+        np.testing.assert_array_equal(ts[:-n_tail], full[count[:-n_tail]])
+
+        # The first audio TTL occurs after all the camera times
+        pin_state['indices'] = np.array([0, 1])
+        audio['times'] = full[-1] + np.array([1., 1.3])
+        for extrapolate in (True, False):
+            with self.assertRaises(AssertionError):
+                camera.align_with_audio(full, audio, pin_state, np.arange(100),
+                                        extrapolate_missing=extrapolate)
+
     def test_attribute_times(self, display=False):
         # Create two timestamp arrays at two different frequencies
         tsa = np.linspace(0, 60, 60 * 4)[:60]  # 240bpm
@@ -771,6 +817,69 @@ class TestCameraExtractors(unittest.TestCase):
         )
         np.testing.assert_array_equal(matches, expected)
 
+        # Offsets are equivalent to pre-shifting the arrays
+        for kwargs in ({}, {'injective': False}, {'take': 'nearest'}, {'tol': .05}):
+            expected = camera.attribute_times(tsa - tsa[0], tsb - tsb[0], **kwargs)
+            matches = camera.attribute_times(tsa, tsb, arr_offset=tsa[0], events_offset=tsb[0],
+                                             **kwargs)
+            np.testing.assert_array_equal(matches, expected)
+            matches = camera.attribute_times(tsa + 50, tsb + 100, arr_offset=50,
+                                             events_offset=100, **kwargs)
+            np.testing.assert_array_equal(matches, camera.attribute_times(tsa, tsb, **kwargs))
+
         # Check input validation
         with self.assertRaises(ValueError):
             camera.attribute_times(tsa, tsb, injective=False, take='closest')
+
+    def test_extract_all(self):
+        labels = ('left', 'right', 'body')
+        delays = dict(zip(labels, (.1, .3, .2)))  # finish out of label order
+
+        def _extract(obj, **_):
+            time.sleep(delays[obj.label])
+            return np.arange(3) + labels.index(obj.label)
+
+        logger = logging.getLogger('ibllib')
+        level = logger.level
+        self.addCleanup(logger.setLevel, level)
+        logger.setLevel(logging.WARNING)
+        with tempfile.TemporaryDirectory() as tdir, \
+                patch.object(camera.CameraTimestampsFPGA, '_extract', _extract):
+            outputs, files = camera.extract_all(
+                Path(tdir), session_type='ephys', labels=labels, sync={}, chmap={}, audio={})
+            self.assertEqual(logger.level, logging.WARNING)
+            self.assertEqual(list(outputs), [f'{label}_camera_timestamps' for label in labels])
+            self.assertEqual([f.name for f in files],
+                             [f'_ibl_{label}Camera.times.npy' for label in labels])
+            for i, (label, ts) in enumerate(outputs.items()):
+                np.testing.assert_array_equal(ts, np.arange(3) + i)
+                np.testing.assert_array_equal(np.load(files[i]), ts)
+
+    def test_get_video_length(self):
+        import cv2
+        with tempfile.TemporaryDirectory() as tdir:
+            video_path = Path(tdir).joinpath('_iblrig_leftCamera.raw.avi')
+            writer = cv2.VideoWriter(str(video_path), cv2.VideoWriter_fourcc(*'MJPG'), 30, (8, 8))
+            for _ in range(5):
+                writer.write(np.zeros((8, 8, 3), dtype=np.uint8))
+            writer.release()
+            camera._get_video_length_cached.cache_clear()
+            self.assertEqual(camera.get_video_length(video_path), 5)
+            self.assertEqual(camera.get_video_length(str(video_path)), 5)
+            self.assertEqual(camera._get_video_length_cached.cache_info().hits, 1)
+            with self.assertRaises(AssertionError):
+                camera.get_video_length(video_path.with_suffix('.mp4'))
+
+    def test_is_strictly_increasing(self):
+        self.assertTrue(camera._is_strictly_increasing(np.arange(5)))
+        self.assertTrue(camera._is_strictly_increasing(np.array([.1])))
+        self.assertFalse(camera._is_strictly_increasing(np.array([0., 1., 1., 2.])))
+        self.assertFalse(camera._is_strictly_increasing(np.array([0., np.nan, 2.])))
+
+    def test_group_median(self):
+        x = np.array([3., 1., 2., 10., 4., 5., 6., 7.])
+        groups = np.array([0, 0, 0, 2, 3, 3, 3, 3])
+        medians = camera._group_median(x, groups, 5)
+        expected = [np.median(x[groups == i]) if np.any(groups == i) else np.nan
+                    for i in range(5)]
+        np.testing.assert_array_equal(medians, expected)
@@ -10,7 +10,7 @@ import sys
 import numpy as np
 
 from oneibl.one import ONE
-from ibllib.io import params, flags, jsonable, spikeglx, hashfile, misc, globus, video
+from ibllib.io import params, flags, jsonable, spikeglx, hashfile, misc, globus, video, ffmpeg
 import ibllib.io.raw_data_loaders as raw
 
 
@@ -722,6 +722,36 @@ class TestsMisc(unittest.TestCase):
         self.assertTrue(all([x == y for x, y in zip(pos, pos_expected)]))
 
 
+class TestsFFmpeg(unittest.TestCase):
+
+    @patch('ibllib.io.ffmpeg.shutil.which', return_value='/usr/bin/ffprobe')
+    @patch('ibllib.io.ffmpeg.subprocess.run')
+    def test_get_frame_count(self, mock_run, _):
+        process = mock_run.return_value
+        # Valid ffprobe output
+        process.returncode = 0
+        process.stdout = b'{"streams": [{"nb_frames": "1200"}]}'
+        self.assertEqual(1200, ffmpeg.get_frame_count('video.mp4'))
+        self.assertIn('video.mp4', mock_run.call_args[0][0])
+        self.assertIn('timeout', mock_run.call_args[1])
+        # Container doesn't report the number of frames
+        process.stdout = b'{"streams": [{}]}'
+        self.assertIsNone(ffmpeg.get_frame_count('video.mp4'))
+        # ffprobe fails
+        process.returncode = 1
+        process.stdout = b''
+        self.assertIsNone(ffmpeg.get_frame_count('video.mp4'))
+        # ffprobe hangs
+        mock_run.side_effect = ffmpeg.subprocess.TimeoutExpired('ffprobe', 30)
+        self.assertIsNone(ffmpeg.get_frame_count('video.mp4'))
+
+    @patch('ibllib.io.ffmpeg.shutil.which', return_value=None)
+    @patch('ibllib.io.ffmpeg.subprocess.run')
+    def test_get_frame_count_no_ffprobe(self, mock_run, _):
+        self.assertIsNone(ffmpeg.get_frame_count('video.mp4'))
+        mock_run.assert_not_called()
+
+
 class TestsGlobus(unittest.TestCase):
     def setUp(self):
         self.patcher = patch.multiple('globus_sdk',